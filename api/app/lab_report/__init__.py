@@ -14,7 +14,7 @@ from .lab_report import LabReportAnalyzer, analyze_lab_report
 # from .medical_extractor import SystemCapabilities, MedicalEntityExtractor
 from .ocr_processor import OCRProcessor
 from .prompt_templates import PromptManager, MedicalPromptTemplates
-from .llm_client import MedicalLLMClient
+from .llm_client import MedicalLLMClient, get_client
 
 __version__ = "1.0.0"
 __all__ = [
@@ -25,5 +25,6 @@ __all__ = [
     "OCRProcessor",
     "PromptManager",
     "MedicalPromptTemplates",
-    "MedicalLLMClient"
+    "MedicalLLMClient",
+    "get_client"
 ]
\ No newline at end of file
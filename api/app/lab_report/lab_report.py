@@ -5,9 +5,10 @@ Integrates OCR and LLM components for comprehensive lab report analysis
 
 import os
 import sys
+import asyncio
+import time
 import logging
-from typing import Dict, Any, Optional, List
-from datetime import datetime
+from typing import Dict, Any, Optional, List, AsyncIterator
 
 # Local module imports
 from .ocr_processor import OCRProcessor
@@ -21,7 +22,7 @@ logger = logging.getLogger(__name__)
 class LabReportAnalyzer:
     """Complete Lab Report Analysis System"""
     
-    def __init__(self, openai_api_key: str = None):
+    def __init__(self, openai_api_key: str = None, llm_client: Optional[MedicalLLMClient] = None):
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         
         logger.info("Initializing Lab Report Analysis System")
@@ -29,7 +30,9 @@ class LabReportAnalyzer:
         self.ocr_processor = OCRProcessor()
         self.prompt_manager = PromptManager()
         
-        if self.openai_api_key and self.openai_api_key != "your-openai-api-key-here":
+        if llm_client is not None:
+            self.llm_client = llm_client
+        elif self.openai_api_key and self.openai_api_key != "your-openai-api-key-here":
             self.llm_client = MedicalLLMClient(self.openai_api_key)
         else:
             self.llm_client = None
@@ -38,83 +41,146 @@ class LabReportAnalyzer:
         logger.info("Lab Report Analyzer initialized successfully")
         
     def analyze_lab_report(self, file_path: str) -> Dict[str, Any]:
-        start_time = datetime.now()
+        """Synchronous analysis for scripts and worker threads; runs OCR and the LLM call on the calling thread"""
+        start_time = time.monotonic()
         
         try:
-            if not self.llm_client:
-                return {
-                    "success": False,
-                    "error": "OpenAI API key not configured. Please set OPENAI_API_KEY environment variable or provide API key during initialization.",
-                    "file_path": file_path,
-                    "processing_time": (datetime.now() - start_time).total_seconds()
-                }
-            
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"File not found: {file_path}")
-            
-            if not self.ocr_processor.is_supported_format(file_path):
-                raise ValueError(f"Unsupported file format. Supported: {self.ocr_processor.get_supported_formats()}")
-            
-            logger.info(f"Starting analysis: {file_path}")
+            early_result = self._check_file(file_path, start_time)
+            if early_result:
+                return early_result
             
             raw_text = self.ocr_processor.extract_text(file_path)
-            
             if not raw_text.strip():
-                return {
-                    "success": False,
-                    "error": "No text could be extracted from the file. Please ensure the image is clear and contains readable text.",
-                    "file_path": file_path,
-                    "processing_time": (datetime.now() - start_time).total_seconds()
-                }
+                return self._no_text_result(file_path, start_time)
             
             logger.info(f"OCR completed: {len(raw_text)} characters extracted")
             
-            lab_data = {
-                "raw_text": raw_text,
-                "medical_entities": [],
-                "lab_values": {},
-                "quantities": [],
-                "lab_analysis": {}
-            }
+            start_llm_time = time.monotonic()
+            ai_analysis_str = self.llm_client.analyze_lab_report(self._build_lab_data(raw_text))
+            llm_processing_time = time.monotonic() - start_llm_time
             
-            start_llm_time = datetime.now()
-            ai_analysis_str = self.llm_client.analyze_lab_report(lab_data)
-            llm_processing_time = (datetime.now() - start_llm_time).total_seconds()
+            return self._build_analysis_result(file_path, raw_text, ai_analysis_str, llm_processing_time, start_time)
             
-            ai_analysis = self.prompt_manager.parse_compact_response(ai_analysis_str)
-
-            analysis_result = {
-                "success": "error" not in ai_analysis,
-                "raw_text": raw_text,
-                "ai_analysis": ai_analysis,
-                "processing_time": llm_processing_time,
-                "system_info": {
-                    "llm_status": self.llm_client.get_system_status()
-                }
-            }
+        except Exception as e:
+            logger.error(f"Complete analysis failed: {e}")
+            return self._failure_result(file_path, e, start_time)
+    
+    async def analyze_lab_report_async(self, file_path: str) -> Dict[str, Any]:
+        start_time = time.monotonic()
+        
+        try:
+            early_result = self._check_file(file_path, start_time)
+            if early_result:
+                return early_result
             
-            analysis_result.update({
-                "file_path": file_path,
-                "file_type": self._get_file_type(file_path),
-                "ocr_method": self._get_ocr_method_used(),
-                "total_processing_time": (datetime.now() - start_time).total_seconds()
-            })
+            raw_text = await asyncio.to_thread(self.ocr_processor.extract_text, file_path)
+            if not raw_text.strip():
+                return self._no_text_result(file_path, start_time)
             
-            if analysis_result["success"]:
-                logger.info(f"Analysis completed successfully in {analysis_result['total_processing_time']:.2f}s")
-            else:
-                logger.error(f"Analysis failed: {analysis_result.get('error', 'Unknown error')}")
+            logger.info(f"OCR completed: {len(raw_text)} characters extracted")
+            
+            start_llm_time = time.monotonic()
+            ai_analysis_str = await self.llm_client.analyze_lab_report_async(self._build_lab_data(raw_text))
+            llm_processing_time = time.monotonic() - start_llm_time
             
-            return analysis_result
+            return self._build_analysis_result(file_path, raw_text, ai_analysis_str, llm_processing_time, start_time)
             
         except Exception as e:
             logger.error(f"Complete analysis failed: {e}")
+            return self._failure_result(file_path, e, start_time)
+    
+    def _check_file(self, file_path: str, start_time: float) -> Optional[Dict[str, Any]]:
+        """Validate configuration and input file, returns an error result when the LLM is not configured"""
+        if not self.llm_client:
             return {
                 "success": False,
-                "error": str(e),
+                "error": "OpenAI API key not configured. Please set OPENAI_API_KEY environment variable or provide API key during initialization.",
                 "file_path": file_path,
-                "processing_time": (datetime.now() - start_time).total_seconds()
+                "processing_time": time.monotonic() - start_time
             }
+        
+        self._validate_file(file_path)
+        logger.info(f"Starting analysis: {file_path}")
+        return None
+    
+    def _validate_file(self, file_path: str) -> None:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+        
+        if not self.ocr_processor.is_supported_format(file_path):
+            raise ValueError(f"Unsupported file format. Supported: {self.ocr_processor.get_supported_formats()}")
+    
+    @staticmethod
+    def _build_lab_data(raw_text: str) -> Dict[str, Any]:
+        return {
+            "raw_text": raw_text,
+            "medical_entities": [],
+            "lab_values": {},
+            "quantities": [],
+            "lab_analysis": {}
+        }
+    
+    @staticmethod
+    def _no_text_result(file_path: str, start_time: float) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": "No text could be extracted from the file. Please ensure the image is clear and contains readable text.",
+            "file_path": file_path,
+            "processing_time": time.monotonic() - start_time
+        }
+    
+    @staticmethod
+    def _failure_result(file_path: str, error: Exception, start_time: float) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": str(error),
+            "file_path": file_path,
+            "processing_time": time.monotonic() - start_time
+        }
+    
+    def _build_analysis_result(self, file_path: str, raw_text: str, ai_analysis_str: str,
+                               llm_processing_time: float, start_time: float) -> Dict[str, Any]:
+        ai_analysis = self.prompt_manager.parse_compact_response(ai_analysis_str)
+
+        analysis_result = {
+            "success": "error" not in ai_analysis,
+            "raw_text": raw_text,
+            "ai_analysis": ai_analysis,
+            "processing_time": llm_processing_time,
+            "system_info": {
+                "llm_status": self.llm_client.get_system_status()
+            }
+        }
+        
+        analysis_result.update({
+            "file_path": file_path,
+            "file_type": self._get_file_type(file_path),
+            "ocr_method": self._get_ocr_method_used(),
+            "total_processing_time": time.monotonic() - start_time
+        })
+        
+        if analysis_result["success"]:
+            logger.info(f"Analysis completed successfully in {analysis_result['total_processing_time']:.2f}s")
+        else:
+            logger.error(f"Analysis failed: {analysis_result.get('error', 'Unknown error')}")
+        
+        return analysis_result
+    
+    async def stream_lab_report(self, file_path: str) -> AsyncIterator[Any]:
+        """Run OCR, then stream the LLM analysis as it is generated"""
+        if not self.llm_client:
+            raise ValueError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable or provide API key during initialization.")
+        
+        self._validate_file(file_path)
+        
+        raw_text = await asyncio.to_thread(self.ocr_processor.extract_text, file_path)
+        if not raw_text.strip():
+            raise ValueError("No text could be extracted from the file. Please ensure the image is clear and contains readable text.")
+        
+        logger.info(f"OCR completed: {len(raw_text)} characters extracted, streaming analysis")
+        
+        async for chunk in self.llm_client.analyze_lab_report_stream(self._build_lab_data(raw_text)):
+            yield chunk
     
     def analyze_text_only(self, text: str) -> Dict[str, Any]:
         if not self.llm_client:
@@ -125,19 +191,11 @@ class LabReportAnalyzer:
             }
         
         logger.info("Starting text-only analysis")
-        start_time = datetime.now()
+        start_time = time.monotonic()
         
         try:
-            lab_data = {
-                "raw_text": text,
-                "medical_entities": [],
-                "lab_values": {},
-                "quantities": [],
-                "lab_analysis": {}
-            }
-            
-            ai_analysis_str = self.llm_client.analyze_lab_report(lab_data)
-            processing_time = (datetime.now() - start_time).total_seconds()
+            ai_analysis_str = self.llm_client.analyze_lab_report(self._build_lab_data(text))
+            processing_time = time.monotonic() - start_time
             
             ai_analysis = self.prompt_manager.parse_compact_response(ai_analysis_str)
 
@@ -160,7 +218,7 @@ class LabReportAnalyzer:
                 "success": False,
                 "error": str(e),
                 "raw_text": text,
-                "processing_time": (datetime.now() - start_time).total_seconds()
+                "processing_time": time.monotonic() - start_time
             }
 
     def analyze_with_context(self, file_path: str, 
@@ -270,5 +328,8 @@ def analyze_lab_report(file_path: str, openai_api_key: str = None) -> Dict[str,
         raise ValueError("OpenAI API key required. Set OPENAI_API_KEY environment variable or pass as parameter.")
     
     analyzer = LabReportAnalyzer(api_key)
-    return analyzer.analyze_lab_report(file_path)
+    try:
+        return analyzer.analyze_lab_report(file_path)
+    finally:
+        analyzer.llm_client.close()
 
@@ -11,11 +11,13 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime, date
 from pathlib import Path
 from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form, BackgroundTasks, Depends, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
-from ..db import get_db
+from ..db import get_db, SessionLocal
 from ..models import LabRecords
 from .lab_report import LabReportAnalyzer
+from .llm_client import MedicalLLMClient, STREAM_RESTART, get_client
 from ..temp.temp_user import temp_user_manager, FeatureType
 
 logging.basicConfig(level=logging.INFO)
@@ -53,26 +55,19 @@ class SystemStatusResponse(BaseModel):
 _analyzer_instance: Optional[LabReportAnalyzer] = None
 
 
-def get_analyzer(api_key: str = None) -> LabReportAnalyzer:
-    """Get or create analyzer instance with improved error handling"""
+def get_analyzer(llm_client: Optional[MedicalLLMClient] = Depends(get_client)) -> LabReportAnalyzer:
+    """FastAPI dependency returning the shared analyzer built on the lifespan-owned LLM client"""
     global _analyzer_instance
     
-    openai_api_key = api_key or os.getenv("OPENAI_API_KEY")
-    
-    if not openai_api_key:
-        deepseek_key = os.getenv("DEEPSEEK_API_KEY")
-        if deepseek_key:
-            logger.warning("OpenAI API key not found, but DeepSeek fallback is available")
-            openai_api_key = "placeholder-for-deepseek-fallback"
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="No AI API keys configured. Please set OPENAI_API_KEY or DEEPSEEK_API_KEY environment variable."
-            )
+    if llm_client is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="No AI API keys configured. Please set OPENAI_API_KEY or DEEPSEEK_API_KEY environment variable."
+        )
     
     if _analyzer_instance is None:
         logger.info("Initializing Lab Report Analyzer with OpenAI + DeepSeek fallback support...")
-        _analyzer_instance = LabReportAnalyzer(openai_api_key)
+        _analyzer_instance = LabReportAnalyzer(llm_client=llm_client)
         
         try:
             system_status = _analyzer_instance.get_system_status()
@@ -150,7 +145,8 @@ async def analyze_lab_report_file(
     user_id: Optional[str] = Form(None),
     email: Optional[str] = Form(None),
     temp_user_id: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    analyzer: LabReportAnalyzer = Depends(get_analyzer)
 ):
     """Analyze lab report from uploaded file with temp user support and rate limiting."""
     
@@ -213,8 +209,7 @@ async def analyze_lab_report_file(
     file_path = await save_upload_file(file)
     
     try:
-        analyzer = get_analyzer()
-        result = analyzer.analyze_lab_report(file_path)
+        result = await analyzer.analyze_lab_report_async(file_path)
         analysis_id = f"analysis_{int(datetime.now().timestamp())}"
         
         if result["success"]:
@@ -268,8 +263,139 @@ async def analyze_lab_report_file(
             logger.warning(f"Failed to clean up file {file_path}: {e}")
 
 
+async def _single_sse_event(event: str, data: Dict[str, Any]):
+    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _save_streamed_analysis(user_id: Optional[str], email: Optional[str], is_temp_user: bool,
+                            session_id: Optional[str], ai_analysis: Dict[str, Any]):
+    """Persist a finished streamed analysis the way /analyze-file does"""
+    if "error" in ai_analysis:
+        return
+    
+    if user_id and email and ai_analysis:
+        # The request's get_db session is closed before a streamed body runs, so use a fresh one
+        db = SessionLocal()
+        try:
+            save_lab_records(db, user_id, email, ai_analysis)
+        except Exception as e:
+            logger.error(f"Failed to save lab records for user {user_id}: {e}")
+        finally:
+            db.close()
+    
+    elif is_temp_user and session_id:
+        try:
+            temp_user_manager.update_temp_session(session_id, {
+                "analysis_results": ai_analysis,
+                "status": "completed"
+            })
+        except Exception as e:
+            logger.warning(f"Failed to update temp session: {e}")
+
+
+@router.post("/analyze-file/stream")
+async def stream_lab_report_file(
+    request: Request,
+    file: UploadFile = File(...),
+    user_id: Optional[str] = Form(None),
+    email: Optional[str] = Form(None),
+    temp_user_id: Optional[str] = Form(None),
+    analyzer: LabReportAnalyzer = Depends(get_analyzer)
+):
+    """Analyze lab report from uploaded file, streaming the AI analysis as Server-Sent Events."""
+    
+    if not file.filename:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No file provided"
+        )
+    
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.pdf']
+    if file_ext not in supported_formats:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported file format {file_ext}. Supported: {supported_formats}"
+        )
+    
+    # Handle temporary user with Redis-based system, exactly as /analyze-file does
+    is_temp_user = not email or not user_id
+    final_temp_user_id = None
+    remaining_daily = None
+    session_id = None
+    
+    if is_temp_user:
+        if temp_user_id and temp_user_manager.is_temp_user(temp_user_id):
+            final_temp_user_id = temp_user_id
+        else:
+            final_temp_user_id = temp_user_manager.create_temp_user_from_request(request)
+        
+        try:
+            access_info = temp_user_manager.check_feature_access(final_temp_user_id, FeatureType.LAB_REPORT)
+            remaining_daily = access_info.get("remaining_daily", 0)
+            
+            # Creating the session is what records usage against the daily limit
+            session_id = temp_user_manager.create_feature_session(
+                final_temp_user_id,
+                FeatureType.LAB_REPORT,
+                {"file_name": file.filename, "file_type": file_ext}
+            )
+            
+            logger.info(f"Streamed lab report analysis started for temp user {final_temp_user_id}, session: {session_id}")
+            
+        except HTTPException as rate_limit_error:
+            return StreamingResponse(
+                _single_sse_event("error", {
+                    "error": rate_limit_error.detail,
+                    "temp_user_id": final_temp_user_id,
+                    "remaining_daily": 0
+                }),
+                media_type="text/event-stream"
+            )
+        except Exception as e:
+            logger.error(f"Error checking temp user access: {e}")
+            return StreamingResponse(
+                _single_sse_event("error", {
+                    "error": "Unable to verify user access",
+                    "temp_user_id": final_temp_user_id
+                }),
+                media_type="text/event-stream"
+            )
+    
+    file_path = await save_upload_file(file)
+    
+    async def event_stream():
+        yield f"event: start\ndata: {json.dumps({'temp_user_id': final_temp_user_id, 'remaining_daily': remaining_daily})}\n\n"
+        
+        chunks: List[str] = []
+        try:
+            async for chunk in analyzer.stream_lab_report(file_path):
+                if chunk is STREAM_RESTART:
+                    # The fallback model restarts the analysis; the client drops the text received so far
+                    chunks.clear()
+                    yield "event: restart\ndata: {}\n\n"
+                    continue
+                chunks.append(chunk)
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+            
+            ai_analysis = analyzer.prompt_manager.parse_compact_response("".join(chunks))
+            _save_streamed_analysis(user_id, email, is_temp_user, session_id, ai_analysis)
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error(f"Streamed analysis failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except Exception as e:
+                logger.warning(f"Failed to clean up file {file_path}: {e}")
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.get("/system/status", response_model=SystemStatusResponse)
-async def get_system_status():
+async def get_system_status(llm_client: Optional[MedicalLLMClient] = Depends(get_client)):
     """Get comprehensive system status for lab analysis including model strategy"""
     try:
         openai_key = os.getenv("OPENAI_API_KEY")
@@ -287,9 +413,7 @@ async def get_system_status():
                 recommendations=["Set OPENAI_API_KEY or DEEPSEEK_API_KEY environment variable"]
             )
         
-        test_key = openai_key or "placeholder-for-deepseek-fallback"
-        temp_analyzer = LabReportAnalyzer(test_key)
-        system_status = temp_analyzer.get_system_status()
+        system_status = get_analyzer(llm_client).get_system_status()
         
         system_info = system_status.get('system_info', {})
         ocr_info = system_status.get('ocr_info', {})
@@ -5,12 +5,21 @@ Main module responsible for LangChain integration, AI API calls, and response pr
 
 import os
 import json
+import asyncio
+import hashlib
+import time
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
+import tempfile
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator
 
+import httpx
+import orjson
+import redis
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
+from openai import OpenAI, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+from tenacity import retry, wait_random_exponential, stop_after_attempt, retry_if_exception_type
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 
@@ -18,21 +27,148 @@ from .prompt_templates import PromptManager
 
 logger = logging.getLogger(__name__)
 
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "20"))
+LLM_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+DEEPSEEK_MODEL = "deepseek/deepseek-r1:free"
+DEEPSEEK_BASE_URL = "https://openrouter.ai/api/v1"
+# ChatOpenAI needs some key to construct the primary client when only DeepSeek is configured
+DEEPSEEK_ONLY_API_KEY = "placeholder-for-deepseek-fallback"
+
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))
+LLM_DEBUG_ERRORS = os.getenv("LLM_DEBUG_ERRORS", "false").lower() == "true"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# The response cache is an optimisation, so an unreachable Redis must fail fast instead of stalling requests
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1.0"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60)
+
+# Yielded by analyze_lab_report_stream when the fallback model starts the analysis over;
+# everything streamed before it should be discarded
+STREAM_RESTART = object()
+
+# Longest single wait between LLM retries, including server-requested Retry-After waits;
+# retries happen inside user requests, so a quota-style Retry-After must not hold one for minutes
+LLM_MAX_RETRY_WAIT = 30
+
+_jittered_backoff = wait_random_exponential(multiplier=1, max=LLM_MAX_RETRY_WAIT)
+
+def _wait_for_retry(retry_state) -> float:
+    """Jittered exponential backoff that honors Retry-After on 429 responses, capped at LLM_MAX_RETRY_WAIT"""
+    backoff = _jittered_backoff(retry_state)
+    error = retry_state.outcome.exception()
+    
+    if isinstance(error, RateLimitError) and error.response is not None:
+        try:
+            return min(max(float(error.response.headers.get("retry-after", 0)), backoff), LLM_MAX_RETRY_WAIT)
+        except ValueError:
+            pass
+    return backoff
+
+_llm_retry = retry(
+    wait=_wait_for_retry,
+    stop=stop_after_attempt(LLM_MAX_RETRIES + 1),
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)),
+    reraise=True,
+)
+
+FALLBACK_ANALYSIS_HEADER = """
+# Lab Report Analysis - Fallback Mode
+
+**Note**: AI analysis temporarily unavailable. Providing basic interpretation based on extracted data.
+
+**Error**: {error}
+
+## System Status:
+- Primary LLM (OpenAI): Failed
+- Fallback LLM (DeepSeek): {fallback_status}
+
+## Extracted Lab Values:
+"""
+
+FALLBACK_ANALYSIS_TRAILER = """
+
+## Important Notice:
+- This is a simplified analysis due to technical issues
+- Please consult with a healthcare professional for proper interpretation
+- Consider retrying the analysis or uploading a clearer image
+- For any concerning values, seek immediate medical attention
+
+## Recommendations:
+1. Verify all values with your healthcare provider
+2. Discuss any abnormal findings with your doctor
+3. Follow up as recommended by your medical team
+4. Try the analysis again later when services are restored
+
+## Technical Support:
+- Check OPENAI_API_KEY configuration
+- Verify network connectivity
+- Contact technical support if issues persist
+"""
+
+def _slow_path_extract(llm_response: Any) -> str:
+    """Extract text from responses that are not chat messages (cached strings, legacy LLM outputs)"""
+    if isinstance(llm_response, str):
+        return llm_response
+    text = getattr(llm_response, 'text', None)
+    if callable(text):
+        return text()
+    return str(llm_response)
+
 class MedicalLLMClient:
     """LLM client optimized for medical analysis with OpenAI + DeepSeek fallback"""
     
     def __init__(self, openai_api_key: str = None, model: str = None):
-        self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
-        self.model = model or os.getenv("OPENAI_MODEL", "gpt-4")
-        self.openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        self.openai_api_key = openai_api_key or OPENAI_API_KEY
+        self.model = model or OPENAI_MODEL
+        self.openai_base_url = OPENAI_BASE_URL
+        self.openai_timeout = OPENAI_TIMEOUT
+        self.max_output_tokens = 2500
+        self.hedge_delay = LLM_HEDGE_DELAY
+        self.debug_errors = LLM_DEBUG_ERRORS
         self.prompt_manager = PromptManager()
+        self._lab_prompt = self.prompt_manager.get_lab_analysis_prompt()
+        self._bulk_lab_prompt = self.prompt_manager.get_bulk_lab_analysis_prompt()
+        
+        self.deepseek_api_key = DEEPSEEK_API_KEY
+        self.deepseek_model = DEEPSEEK_MODEL
+        self.deepseek_base_url = DEEPSEEK_BASE_URL
         
-        self.deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
-        self.deepseek_model = "deepseek/deepseek-r1:free"
-        self.deepseek_base_url = "https://openrouter.ai/api/v1"
+        self.http_client = httpx.Client(http2=True, limits=HTTP_POOL_LIMITS)
+        self.http_async_client = httpx.AsyncClient(http2=True, limits=HTTP_POOL_LIMITS)
         
         self.llm = self._initialize_openai_llm(self.model, self.openai_api_key)
         self.fallback_llm = self._initialize_deepseek_llm() if self.deepseek_api_key else None
+        self._batch_client: Optional[OpenAI] = None
+        
+        self.cache_ttl = LLM_CACHE_TTL
+        self.cache = self._initialize_cache()
+        self.async_cache = self._initialize_async_cache() if self.cache is not None else None
+        
+        # Status never changes after construction, so build it once for health/status polling
+        self._system_status = {
+            "primary_llm": {
+                "model": self.model,
+                "available": True,
+                "provider": f"OpenAI ({self.model})",
+                "base_url": self.openai_base_url
+            },
+            "fallback_llm": {
+                "model": self.deepseek_model,
+                "available": self.fallback_llm is not None,
+                "provider": "DeepSeek (via OpenRouter)",
+                "configured": bool(self.deepseek_api_key)
+            },
+            "fallback_strategy": "DeepSeek via OpenRouter with custom headers"
+        }
         
         logger.info(f"Medical LLM Client initialized with primary model: {self.model}")
         if self.fallback_llm:
@@ -46,6 +182,12 @@ class MedicalLLMClient:
             model=model,
             api_key=api_key,
             base_url=self.openai_base_url,
+            temperature=0.1,
+            max_tokens=self.max_output_tokens,
+            request_timeout=self.openai_timeout,
+            max_retries=0,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
         )
     
     def _initialize_deepseek_llm(self) -> Optional[ChatOpenAI]:
@@ -56,9 +198,11 @@ class MedicalLLMClient:
                 api_key=self.deepseek_api_key,
                 base_url=self.deepseek_base_url,
                 temperature=0.1,
-                max_tokens=2500,
+                max_tokens=self.max_output_tokens,
                 request_timeout=120,
-                max_retries=2,
+                max_retries=0,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client,
                 default_headers={
                     "HTTP-Referer": "https://medicobud.com/",
                     "X-Title": "medicobud.com"
@@ -68,40 +212,156 @@ class MedicalLLMClient:
             logger.error(f"Failed to initialize DeepSeek fallback: {e}")
             return None
     
-    def _execute_with_fallback(self, chain_func, formatted_data: Dict[str, Any], operation: str) -> str:
-        """Execute LLM operation with fallback to DeepSeek"""
+    async def warm_up(self) -> None:
+        """Open a pooled TLS connection to the OpenAI endpoint ahead of the first request"""
+        try:
+            await self.http_async_client.head(f"{self.openai_base_url}/models", timeout=5)
+            logger.info("OpenAI connection pool warmed up")
+        except Exception as e:
+            logger.warning(f"OpenAI connection warm-up failed: {e}")
+    
+    async def aclose(self) -> None:
+        """Close the pooled HTTP and Redis connections, called once on app shutdown"""
+        await self.http_async_client.aclose()
+        if self.async_cache is not None:
+            await self.async_cache.aclose()
+        self.close()
+    
+    def close(self) -> None:
+        """Close the sync HTTP and Redis connections (scripts that never touch the async path)"""
+        self.http_client.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    def _initialize_cache(self) -> Optional[redis.Redis]:
+        """Connect to Redis for exact-match response caching, None when unavailable"""
+        try:
+            client = redis.from_url(REDIS_URL, decode_responses=True,
+                                    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                                    socket_timeout=REDIS_SOCKET_TIMEOUT)
+            client.ping()
+            logger.info("LLM response cache enabled (Redis)")
+            return client
+        except Exception as e:
+            logger.warning(f"LLM response cache disabled - Redis unavailable: {e}")
+            return None
+    
+    def _initialize_async_cache(self) -> aioredis.Redis:
+        """Async Redis client for the event-loop path, so cache lookups never block the loop"""
+        return aioredis.from_url(REDIS_URL, decode_responses=True,
+                                 socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                                 socket_timeout=REDIS_SOCKET_TIMEOUT)
+    
+    def _cache_key(self, messages: List[Any]) -> str:
+        """Hash the model, prompt messages and token cap into a cache key"""
+        payload = {
+            "model": self.model,
+            "messages": [(message.type, message.content) for message in messages],
+            "max_tokens": self.max_output_tokens
+        }
+        return "llm:" + hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+    
+    def _cache_set(self, key: str, response: Any) -> None:
+        content = getattr(response, 'content', response)
+        if self.cache is None or not isinstance(content, str) or not content.strip():
+            return
+        try:
+            self.cache.setex(key, self.cache_ttl, content)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+    
+    async def _acache_get(self, key: str) -> Optional[str]:
+        if self.async_cache is None:
+            return None
+        try:
+            return await self.async_cache.get(key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+    
+    async def _acache_set(self, key: str, response: Any) -> None:
+        content = getattr(response, 'content', response)
+        if self.async_cache is None or not isinstance(content, str) or not content.strip():
+            return
+        try:
+            await self.async_cache.setex(key, self.cache_ttl, content)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+    
+    def _cached_invoke(self, llm, messages: List[Any]) -> Any:
+        """Invoke the LLM on prompt messages, serving exact repeats from the cache"""
+        key = self._cache_key(messages)
+        cached = self._cache_get(key)
+        if cached is not None:
+            logger.info("LLM cache hit")
+            return cached
+        
+        response = self._invoke_with_retry(llm, messages)
+        self._cache_set(key, response)
+        return response
+    
+    async def _cached_ainvoke(self, llm, messages: List[Any]) -> Any:
+        """Async counterpart of _cached_invoke"""
+        key = self._cache_key(messages)
+        cached = await self._acache_get(key)
+        if cached is not None:
+            logger.info("LLM cache hit")
+            return cached
+        
+        response = await self._ainvoke_with_retry(llm, messages)
+        await self._acache_set(key, response)
+        return response
+    
+    @_llm_retry
+    def _invoke_with_retry(self, runnable, payload: Any) -> Any:
+        """Invoke an LLM or chain, retrying rate-limit/timeout errors with jittered backoff"""
+        return runnable.invoke(payload)
+    
+    @_llm_retry
+    async def _ainvoke_with_retry(self, runnable, payload: Any) -> Any:
+        """Async counterpart of _invoke_with_retry"""
+        return await runnable.ainvoke(payload)
+    
+    def _invoke_to_text(self, llm, messages: List[Any], parser: Any = None, cache: bool = False) -> str:
+        """Invoke an LLM on prompt messages and return its non-empty response text"""
+        llm_response = self._cached_invoke(llm, messages) if cache else self._invoke_with_retry(llm, messages)
+        response = parser.invoke(llm_response) if parser else self._response_text(llm_response)
+        if not response or not response.strip():
+            raise ValueError(f"Empty response from {getattr(llm, 'model_name', 'LLM')}")
+        return response
+    
+    async def _ainvoke_to_text(self, llm, messages: List[Any], parser: Any = None, cache: bool = False) -> str:
+        """Async counterpart of _invoke_to_text"""
+        if cache:
+            llm_response = await self._cached_ainvoke(llm, messages)
+        else:
+            llm_response = await self._ainvoke_with_retry(llm, messages)
+        response = parser.invoke(llm_response) if parser else self._response_text(llm_response)
+        if not response or not response.strip():
+            raise ValueError(f"Empty response from {getattr(llm, 'model_name', 'LLM')}")
+        return response
+    
+    def _operation_messages(self, operation: str, formatted_data: Dict[str, Any]) -> Tuple[List[Any], Any]:
+        """Format the prompt messages and look up the output parser for a named LLM operation"""
+        prompt_template, parser = self.prompt_manager.get_prompt_and_parser(operation)
+        return prompt_template.format_prompt(**formatted_data).to_messages(), parser
+    
+    def _execute_with_fallback(self, operation: str, formatted_data: Dict[str, Any]) -> str:
+        """Sync counterpart of _race_with_fallback: try OpenAI, then DeepSeek, without hedging"""
+        messages, parser = self._operation_messages(operation, formatted_data)
+        
         try:
             logger.info(f"Attempting {operation} with OpenAI ({self.model})")
-            
-            try:
-                prompt_template = chain_func.__closure__[0].cell_contents if hasattr(chain_func, '__closure__') else None
-                if prompt_template is None:
-                    chain = chain_func(self.llm)
-                    response = chain.invoke(formatted_data)
-                else:
-                    messages = prompt_template.format_prompt(**formatted_data).to_messages()
-                    llm_response = self.llm.invoke(messages)
-                    
-                    if hasattr(llm_response, 'content'):
-                        response = llm_response.content
-                    elif hasattr(llm_response, 'text') and callable(getattr(llm_response, 'text')):
-                        response = llm_response.text()
-                    elif isinstance(llm_response, str):
-                        response = llm_response
-                    else:
-                        response = str(llm_response)
-                    
-                    if response is None or not response.strip():
-                        raise ValueError("Empty response from direct OpenAI call")
-                
-            except Exception as direct_error:
-                logger.warning(f"Direct invocation failed: {direct_error}, trying chain approach")
-                chain = chain_func(self.llm)
-                response = chain.invoke(formatted_data)
-            
-            if not response or not response.strip():
-                raise ValueError("Empty response from OpenAI")
-            
+            response = self._invoke_to_text(self.llm, messages, parser=parser, cache=True)
             logger.info(f"{operation} completed with OpenAI")
             return response
             
@@ -111,12 +371,7 @@ class MedicalLLMClient:
             if self.fallback_llm:
                 try:
                     logger.info(f"Attempting {operation} with DeepSeek fallback")
-                    chain = chain_func(self.fallback_llm)
-                    response = chain.invoke(formatted_data)
-                    
-                    if not response or not response.strip():
-                        raise ValueError("Empty response from DeepSeek fallback")
-                    
+                    response = self._invoke_to_text(self.fallback_llm, messages, parser=parser)
                     logger.info(f"{operation} completed with DeepSeek fallback")
                     return f"[Analyzed with DeepSeek fallback]\n\n{response}"
                     
@@ -129,59 +384,98 @@ class MedicalLLMClient:
                 return self._generate_error_fallback(formatted_data, operation, 
                                                    f"OpenAI failed: {openai_error}. DeepSeek fallback not configured.")
     
+    @staticmethod
+    def _response_text(llm_response: Any) -> str:
+        """Extract the text from an LLM response, reading AIMessage.content directly in the common case"""
+        try:
+            return llm_response.content
+        except AttributeError:
+            return _slow_path_extract(llm_response)
+    
+    async def _race_with_fallback(self, operation: str, formatted_data: Dict[str, Any]) -> str:
+        """Race OpenAI against a DeepSeek hedge started after hedge_delay (or as soon as OpenAI fails)"""
+        messages, parser = self._operation_messages(operation, formatted_data)
+        primary_failed = asyncio.Event()
+        
+        async def run_primary() -> str:
+            try:
+                return await self._ainvoke_to_text(self.llm, messages, parser=parser, cache=True)
+            except Exception:
+                primary_failed.set()
+                raise
+        
+        async def run_fallback() -> str:
+            try:
+                await asyncio.wait_for(primary_failed.wait(), timeout=self.hedge_delay)
+            except asyncio.TimeoutError:
+                pass
+            logger.info(f"Starting DeepSeek hedge for {operation}")
+            response = await self._ainvoke_to_text(self.fallback_llm, messages, parser=parser)
+            return f"[Analyzed with DeepSeek fallback]\n\n{response}"
+        
+        logger.info(f"Attempting {operation} with OpenAI ({self.model})")
+        providers = {asyncio.create_task(run_primary()): "OpenAI"}
+        if self.fallback_llm:
+            providers[asyncio.create_task(run_fallback())] = "DeepSeek"
+        
+        errors: Dict[str, Exception] = {}
+        pending = set(providers)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = providers[task]
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        logger.warning(f"{provider} {operation} failed: {e}")
+                        errors[provider] = e
+                        continue
+                    logger.info(f"{operation} completed with {provider}")
+                    return response
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        if self.fallback_llm:
+            error_msg = f"Both OpenAI ({errors.get('OpenAI')}) and DeepSeek ({errors.get('DeepSeek')}) failed"
+        else:
+            error_msg = f"OpenAI failed: {errors.get('OpenAI')}. DeepSeek fallback not configured."
+        logger.error(f"All providers failed for {operation}")
+        return self._generate_error_fallback(formatted_data, operation, error_msg)
+    
     def analyze_lab_report(self, lab_data: Dict[str, Any]) -> str:
+        """Synchronous lab analysis over the sync HTTP client, safe to call outside the server event loop"""
+        try:
+            validated_data = self.prompt_manager.validate_prompt_data(lab_data)
+            formatted_data = self.prompt_manager.format_lab_data_for_prompt(validated_data)
+            
+            logger.info("Starting comprehensive lab analysis")
+            start_time = time.monotonic()
+            
+            response = self._execute_with_fallback("comprehensive lab analysis", formatted_data)
+            
+            processing_time = time.monotonic() - start_time
+            logger.info(f"Comprehensive lab analysis completed in {processing_time:.2f} seconds")
+            
+            return response
+            
+        except Exception as e:
+            logger.error(f"Lab analysis failed completely: {e}", exc_info=True)
+            return self._generate_fallback_analysis(lab_data, str(e))
+    
+    async def analyze_lab_report_async(self, lab_data: Dict[str, Any]) -> str:
         """Comprehensive lab report analysis with direct response handling"""
         try:
             validated_data = self.prompt_manager.validate_prompt_data(lab_data)
             formatted_data = self.prompt_manager.format_lab_data_for_prompt(validated_data)
-            prompt_template = self.prompt_manager.get_lab_analysis_prompt(validated_data)
             
             logger.info("Starting comprehensive lab analysis")
-            start_time = datetime.now()
+            start_time = time.monotonic()
             
-            try:
-                messages = prompt_template.format_prompt(**formatted_data).to_messages()
-                llm_response = self.llm.invoke(messages)
-                
-                if hasattr(llm_response, 'content'):
-                    response = llm_response.content
-                elif hasattr(llm_response, 'text') and callable(getattr(llm_response, 'text')):
-                    response = llm_response.text()
-                elif isinstance(llm_response, str):
-                    response = llm_response
-                else:
-                    response = str(llm_response)
-                
-                if not response or not response.strip():
-                    raise ValueError("Empty response from direct OpenAI call")
-                
-                logger.info(f"Direct OpenAI call successful")
-                
-            except Exception as direct_error:
-                logger.warning(f"Direct OpenAI call failed: {direct_error}")
-                
-                if self.fallback_llm:
-                    logger.info("Attempting with DeepSeek fallback")
-                    try:
-                        chain = prompt_template | self.fallback_llm | StrOutputParser()
-                        response = chain.invoke(formatted_data)
-                        
-                        if not response or not response.strip():
-                            raise ValueError("Empty response from DeepSeek")
-                        
-                        logger.info("DeepSeek fallback successful")
-                        response = f"[Analyzed with DeepSeek fallback]\n\n{response}"
-                        
-                    except Exception as deepseek_error:
-                        logger.error(f"DeepSeek fallback also failed: {deepseek_error}")
-                        return self._generate_error_fallback(formatted_data, "comprehensive lab analysis", 
-                                                           f"Both OpenAI ({direct_error}) and DeepSeek ({deepseek_error}) failed")
-                else:
-                    logger.error("No fallback available")
-                    return self._generate_error_fallback(formatted_data, "comprehensive lab analysis", 
-                                                       f"OpenAI failed: {direct_error}. DeepSeek fallback not configured.")
+            response = await self._race_with_fallback("comprehensive lab analysis", formatted_data)
             
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = time.monotonic() - start_time
             logger.info(f"Comprehensive lab analysis completed in {processing_time:.2f} seconds")
             
             return response
@@ -190,6 +484,184 @@ class MedicalLLMClient:
             logger.error(f"Lab analysis failed completely: {e}", exc_info=True)
             return self._generate_fallback_analysis(lab_data, str(e))
     
+    async def analyze_lab_report_stream(self, lab_data: Dict[str, Any]) -> AsyncIterator[Any]:
+        """Stream the lab analysis token by token, yielding STREAM_RESTART before DeepSeek starts over mid-stream"""
+        validated_data = self.prompt_manager.validate_prompt_data(lab_data)
+        formatted_data = self.prompt_manager.format_lab_data_for_prompt(validated_data)
+        messages = self._lab_prompt.format_prompt(**formatted_data).to_messages()
+        
+        logger.info("Starting streamed lab analysis")
+        streamed = False
+        try:
+            async for text in self._stream_text(self.llm, messages):
+                streamed = True
+                yield text
+            return
+        except Exception as openai_error:
+            logger.warning(f"OpenAI stream failed: {openai_error}")
+            error_msg = f"OpenAI failed: {openai_error}. DeepSeek fallback not configured."
+        
+        if self.fallback_llm:
+            logger.info("Restarting streamed lab analysis with DeepSeek fallback")
+            if streamed:
+                yield STREAM_RESTART
+                streamed = False
+            try:
+                async for text in self._stream_text(self.fallback_llm, messages):
+                    streamed = True
+                    yield text
+                return
+            except Exception as deepseek_error:
+                logger.error(f"DeepSeek stream failed: {deepseek_error}")
+                error_msg = f"Both OpenAI and DeepSeek ({deepseek_error}) failed"
+        
+        if streamed:
+            yield STREAM_RESTART
+        yield self._generate_error_fallback(formatted_data, "streamed lab analysis", error_msg)
+    
+    async def _stream_text(self, llm, messages: List[Any]) -> AsyncIterator[str]:
+        """Stream non-empty response text; errors before the first token are retried like any other call"""
+        first_text, stream = await self._open_stream(llm, messages)
+        if first_text is None:
+            return
+        yield first_text
+        async for chunk in stream:
+            if chunk.content:
+                yield chunk.content
+    
+    @_llm_retry
+    async def _open_stream(self, llm, messages: List[Any]) -> Tuple[Optional[str], AsyncIterator[Any]]:
+        """Start a stream and wait for its first non-empty chunk, returns (text, rest of stream)"""
+        stream = llm.astream(messages)
+        async for chunk in stream:
+            if chunk.content:
+                return chunk.content, stream
+        return None, stream
+    
+    def analyze_lab_reports_bulk(self, reports: List[Dict[str, Any]], batch_size: int = 8,
+                                 per_report_tokens: int = 1500) -> List[str]:
+        """Analyze several lab reports with one LLM request per batch of reports"""
+        results: List[str] = []
+        for batch_start in range(0, len(reports), batch_size):
+            batch = reports[batch_start:batch_start + batch_size]
+            messages = self._bulk_lab_prompt.format_prompt(
+                report_count=len(batch),
+                reports=self.prompt_manager.format_bulk_reports(batch)
+            ).to_messages()
+            max_tokens = len(batch) * per_report_tokens
+            
+            logger.info(f"Starting bulk lab analysis for reports {batch_start + 1}-{batch_start + len(batch)}")
+            
+            response = ""
+            try:
+                llm_response = self._invoke_with_retry(self.llm.bind(max_tokens=max_tokens), messages)
+                response = getattr(llm_response, 'content', None) or ""
+            except Exception as openai_error:
+                logger.warning(f"Bulk OpenAI call failed: {openai_error}")
+                if self.fallback_llm:
+                    try:
+                        llm_response = self._invoke_with_retry(self.fallback_llm.bind(max_tokens=max_tokens), messages)
+                        response = getattr(llm_response, 'content', None) or ""
+                    except Exception as deepseek_error:
+                        logger.error(f"Bulk DeepSeek fallback failed: {deepseek_error}")
+            
+            sections = self.prompt_manager.split_bulk_response(response, len(batch))
+            for lab_data, section in zip(batch, sections):
+                if section is None:
+                    results.append(self._generate_fallback_analysis(lab_data, "Report missing from bulk LLM response"))
+                else:
+                    results.append(section)
+        
+        return results
+    
+    def _build_lab_messages(self, lab_data: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Build OpenAI chat-completions messages for a single lab report"""
+        validated_data = self.prompt_manager.validate_prompt_data(lab_data)
+        formatted_data = self.prompt_manager.format_lab_data_for_prompt(validated_data)
+        
+        roles = {"system": "system", "human": "user", "ai": "assistant"}
+        return [
+            {"role": roles.get(message.type, "user"), "content": message.content}
+            for message in self._lab_prompt.format_prompt(**formatted_data).to_messages()
+        ]
+    
+    def _get_batch_client(self) -> OpenAI:
+        """Lazily create the raw OpenAI client used for the Batch API"""
+        if self._batch_client is None:
+            self._batch_client = OpenAI(api_key=self.openai_api_key, base_url=self.openai_base_url,
+                                        http_client=self.http_client)
+        return self._batch_client
+    
+    def submit_batch_analysis(self, reports: List[Dict[str, Any]]) -> str:
+        """Submit non-interactive lab analyses through the OpenAI Batch API, returns the batch id"""
+        client = self._get_batch_client()
+        
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as batch_file:
+            for i, lab_data in enumerate(reports):
+                request = {
+                    "custom_id": str(lab_data.get("report_id", f"report-{i}")),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": self.model,
+                        "messages": self._build_lab_messages(lab_data),
+                        "max_tokens": self.max_output_tokens
+                    }
+                }
+                batch_file.write(json.dumps(request) + "\n")
+            batch_path = batch_file.name
+        
+        try:
+            with open(batch_path, "rb") as f:
+                input_file = client.files.create(file=f, purpose="batch")
+            batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+        finally:
+            os.remove(batch_path)
+        
+        logger.info(f"Submitted batch {batch.id} with {len(reports)} lab reports")
+        return batch.id
+    
+    def poll_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Check a submitted batch and collect its analyses once completed"""
+        client = self._get_batch_client()
+        batch = client.batches.retrieve(batch_id)
+        result = {"batch_id": batch_id, "status": batch.status, "results": {}}
+        
+        if batch.status != "completed" or not batch.output_file_id:
+            return result
+        
+        output = client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                content = record["response"]["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                content = self._generate_fallback_analysis({}, str(record.get("error") or "Batch request failed"))
+            result["results"][record["custom_id"]] = content
+        
+        return result
+    
+    def _summarize_data(self, formatted_data: Dict[str, Any]) -> str:
+        """Short, PHI-free summary of prompt data for error responses (full JSON only in debug mode)"""
+        if not formatted_data:
+            return "No data available"
+        if self.debug_errors:
+            return orjson.dumps(formatted_data, option=orjson.OPT_INDENT_2, default=str).decode()
+        
+        lab_values = formatted_data.get("lab_values")
+        if isinstance(lab_values, str):
+            lab_value_count = 0 if lab_values in ("", "None") else lab_values.count(" | ") + 1
+        else:
+            lab_value_count = len(lab_values or {})
+        
+        return f"- Fields: {', '.join(list(formatted_data.keys())[:10])}\n- Lab values: {lab_value_count}"
+    
     def _generate_error_fallback(self, formatted_data: Dict[str, Any], operation: str, error_msg: str) -> str:
         """Generate error fallback when both primary and fallback LLMs fail"""
         return f"""
@@ -202,7 +674,7 @@ class MedicalLLMClient:
 - Fallback LLM (DeepSeek): {"Failed" if self.fallback_llm else "Not configured"}
 
 ## Available Data:
-{json.dumps(formatted_data, indent=2) if formatted_data else "No data available"}
+{self._summarize_data(formatted_data)}
 
 ## Recommendations:
 1. Check your OPENAI_API_KEY and network connection
@@ -215,71 +687,56 @@ class MedicalLLMClient:
     
     def _generate_fallback_analysis(self, lab_data: Dict[str, Any], error: str) -> str:
         """Generate fallback analysis when LLM fails"""
-        fallback_analysis = f"""
-# Lab Report Analysis - Fallback Mode
-
-**Note**: AI analysis temporarily unavailable. Providing basic interpretation based on extracted data.
-
-**Error**: {error}
-
-## System Status:
-- Primary LLM (OpenAI): Failed
-- Fallback LLM (DeepSeek): {"Failed" if self.fallback_llm else "Not configured"}
-
-## Extracted Lab Values:
-"""
+        parts = [FALLBACK_ANALYSIS_HEADER.format(
+            error=error,
+            fallback_status="Failed" if self.fallback_llm else "Not configured"
+        )]
         
         lab_values = lab_data.get("lab_values", {})
         if lab_values:
             for test_name, values in lab_values.items():
-                fallback_analysis += f"\n- **{test_name.title()}**: "
+                parts.append(f"\n- **{test_name.title()}**: ")
                 if isinstance(values, list) and values:
-                    for value, unit in values:
-                        fallback_analysis += f"{value} {unit}"
+                    parts.append(", ".join(f"{value} {unit}" for value, unit in values))
                 else:
-                    fallback_analysis += str(values)
+                    parts.append(str(values))
         else:
-            fallback_analysis += "\nNo lab values detected in the report."
-        
-        fallback_analysis += """
-
-## Important Notice:
-- This is a simplified analysis due to technical issues
-- Please consult with a healthcare professional for proper interpretation
-- Consider retrying the analysis or uploading a clearer image
-- For any concerning values, seek immediate medical attention
-
-## Recommendations:
-1. Verify all values with your healthcare provider
-2. Discuss any abnormal findings with your doctor
-3. Follow up as recommended by your medical team
-4. Try the analysis again later when services are restored
-
-## Technical Support:
-- Check OPENAI_API_KEY configuration
-- Verify network connectivity
-- Contact technical support if issues persist
-"""
+            parts.append("\nNo lab values detected in the report.")
         
-        return fallback_analysis
+        parts.append(FALLBACK_ANALYSIS_TRAILER)
+        return "".join(parts)
     
     def get_system_status(self) -> Dict[str, Any]:
         """Get current system status including fallback availability"""
-        return {
-            "primary_llm": {
-                "model": self.model,
-                "available": True,
-                "provider": f"OpenAI ({self.model})",
-                "base_url": self.openai_base_url
-            },
-            "fallback_llm": {
-                "model": self.deepseek_model,
-                "available": self.fallback_llm is not None,
-                "provider": "DeepSeek (via OpenRouter)",
-                "configured": bool(self.deepseek_api_key)
-            },
-            "fallback_strategy": "DeepSeek via OpenRouter with custom headers"
-        }
+        return {key: dict(value) if isinstance(value, dict) else value
+                for key, value in self._system_status.items()}
+
+_shared_client: Optional[MedicalLLMClient] = None
+
+async def start_client() -> Optional[MedicalLLMClient]:
+    """Build the process-wide MedicalLLMClient from the app lifespan and warm its connection pool"""
+    global _shared_client
+    if not (OPENAI_API_KEY or DEEPSEEK_API_KEY):
+        logger.warning("No AI API keys configured - LLM analysis unavailable")
+        return None
+    if not OPENAI_API_KEY:
+        logger.warning("OpenAI API key not found, but DeepSeek fallback is available")
+    
+    # Construction pings Redis, so keep it off the event loop
+    _shared_client = await asyncio.to_thread(MedicalLLMClient, OPENAI_API_KEY or DEEPSEEK_ONLY_API_KEY)
+    await _shared_client.warm_up()
+    return _shared_client
+
+async def stop_client() -> None:
+    """Close the process-wide client's HTTP and Redis pools on app shutdown"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
+
+def get_client() -> Optional[MedicalLLMClient]:
+    """FastAPI dependency returning the lifespan-owned MedicalLLMClient, None when no API key is configured"""
+    return _shared_client
 
 if __name__ == "__main__":
     api_key = os.getenv("OPENAI_API_KEY", "your-openai-api-key-here")
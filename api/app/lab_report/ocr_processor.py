@@ -3,40 +3,224 @@ OCR Processing Module
 Handles text extraction from images and PDFs using Tesseract and OCR.space API
 """
 
+import io
 import os
 import re
+import hashlib
 import logging
-from typing import Optional
+import stat
+import tempfile
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+from typing import Optional, Union
 from PIL import Image, ImageEnhance, ImageFilter
 import pytesseract
 import PyPDF2
 from pdf2image import convert_from_path
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from tesserocr import PyTessBaseAPI, PSM, OEM
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+TESSERACT_CHAR_WHITELIST = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.,%():/-"
+
+# Page segmentation modes tried in order until one reads enough text: sparse text (11)
+# copes with tabular reports, uniform block (6) with running text
+TESSERACT_PAGE_SEG_MODES = (11, 6)
+
+# Extracted text is cached on disk under this directory, keyed by file content. Off
+# unless OCR_CACHE_DIR is set; the directory must be owned by this user with mode 0700
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "")
+
+# Cache entries older than this many seconds are ignored and removed, and at most
+# this many entries are kept (oldest removed first)
+OCR_CACHE_TTL = int(os.getenv("OCR_CACHE_TTL", "604800"))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "1000"))
+
+# Bytes read per step when hashing a file for the OCR cache key
+CACHE_HASH_CHUNK_SIZE = 1 << 20
+
+# Below either limit an image goes to OCR.space before Tesseract: the shorter side in
+# pixels, and the variance of the Laplacian (a sharpness measure)
+OCR_MIN_SHORT_SIDE = 800
+OCR_MIN_SHARPNESS = 80.0
+
+# cv2.adaptiveThreshold neighbourhood (odd, in pixels) and the constant subtracted from its mean
+ADAPTIVE_THRESHOLD_BLOCK_SIZE = 31
+ADAPTIVE_THRESHOLD_OFFSET = 10
+
+# _clean_text patterns, compiled once
+_WHITESPACE_RE = re.compile(r'\s+')
+_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s\.,\(\)\-\%\:\;\/\<\>]')
+
+# Letters misread for digits. Applied in this order, one pass each: fixing one can
+# put a digit next to the next, so they cannot share a single alternation
+_DIGIT_FIXES = (
+    (re.compile(r'\bO\b(?=\s*\d)', re.IGNORECASE), '0'),
+    (re.compile(r'\bl\b(?=\s*\d)', re.IGNORECASE), '1'),
+    (re.compile(r'\bS\b(?=\s*\d)', re.IGNORECASE), '5'),
+)
+
+# Unit spellings normalized in one pass; longer units come first so "mg/dl" wins over "g/dl"
+_UNIT_FIXES = {
+    'mg/dl': 'mg/dL',
+    'g/dl': 'g/dL',
+    'meq/l': 'mEq/L',
+    'mmol/l': 'mmol/L',
+    'iu/l': 'IU/L',
+    'u/l': 'U/L'
+}
+_UNIT_RE = re.compile('|'.join(map(re.escape, _UNIT_FIXES)), re.IGNORECASE)
+
+# Upper bound on worker processes OCRing the pages of one scanned PDF
+PDF_OCR_MAX_WORKERS = 4
+
+# Per-worker-process OCRProcessor, created on the first page that worker handles
+_page_worker_processor = None
+
+# One process pool shared by every scanned PDF, created on first use. Workers are
+# spawned, not forked: forking the threaded server can copy a held logging-queue
+# lock into the child and hang it
+_page_workers: Optional[ProcessPoolExecutor] = None
+_page_workers_lock = threading.Lock()
+
+
+def _init_page_worker() -> None:
+    """Process-pool initializer: spawned workers log straight to stderr"""
+    logging.basicConfig(level=logging.INFO)
+
+
+def _get_page_workers() -> ProcessPoolExecutor:
+    """Return the shared PDF page pool, creating it on first use"""
+    global _page_workers
+    with _page_workers_lock:
+        if _page_workers is None:
+            _page_workers = ProcessPoolExecutor(
+                max_workers=min(os.cpu_count() or 1, PDF_OCR_MAX_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_page_worker
+            )
+        return _page_workers
+
+
+def _reset_page_workers(broken_pool: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died so the next PDF gets a fresh one"""
+    global _page_workers
+    with _page_workers_lock:
+        if _page_workers is broken_pool:
+            _page_workers = None
+    broken_pool.shutdown(wait=False)
+
+
+def _ocr_pdf_page_worker(pdf_path: str, page_number: int) -> str:
+    """Process-pool entry point: OCR one page of a PDF"""
+    global _page_worker_processor
+    if _page_worker_processor is None:
+        _page_worker_processor = OCRProcessor()
+    return _page_worker_processor.ocr_pdf_page(pdf_path, page_number)
+
+
+def _describe_source(source: Union[str, Image.Image]) -> str:
+    """Name an OCR source for log messages"""
+    return source if isinstance(source, str) else f"<{source.width}x{source.height} image>"
+
+
 class OCRProcessor:
     """Advanced OCR processing with Tesseract + OCR.space API fallback"""
     
     def __init__(self):
-        self.tesseract_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.,%():/-'
+        # --psm is added per call from TESSERACT_PAGE_SEG_MODES
+        self.tesseract_config = rf'--oem 3 -c tessedit_char_whitelist={TESSERACT_CHAR_WHITELIST}'
         self.ocr_space_api_key = os.getenv("OCR_SPACE_API_KEY")
         self.ocr_space_url = "https://api.ocr.space/parse/image"
         self.max_retries = 2
         
-        try:
-            pytesseract.get_tesseract_version()
-            logger.info("Tesseract OCR available")
-        except Exception as e:
-            logger.warning(f"Tesseract OCR unavailable: {e}")
+        # Keep-alive connections to OCR.space, reused across pages and calls. Connection
+        # errors, 429 and 5xx are retried here with backoff; the loop in
+        # extract_text_ocr_space only retries errors OCR.space reports in its response
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=16,
+            max_retries=Retry(
+                total=self.max_retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"POST"}),
+                raise_on_status=False
+            )
+        ))
+        
+        self._cache_dir = self._open_cache_dir(OCR_CACHE_DIR) if OCR_CACHE_DIR else None
+        # Anything that changes OCR output for the same bytes goes into the cache key
+        self._cache_salt = (
+            f"{self.tesseract_config}|psm={TESSERACT_PAGE_SEG_MODES}|tesserocr={TESSEROCR_AVAILABLE}"
+            f"|cv2={CV2_AVAILABLE}|ocr_space={bool(self.ocr_space_api_key)}"
+        ).encode()
+        
+        # One in-process tesserocr engine per thread; a PyTessBaseAPI is not reentrant
+        self._tesserocr_local = threading.local()
+        
+        if TESSEROCR_AVAILABLE:
+            logger.info("Tesseract OCR available (in-process via tesserocr)")
+        else:
+            try:
+                pytesseract.get_tesseract_version()
+                logger.info("Tesseract OCR available")
+            except Exception as e:
+                logger.warning(f"Tesseract OCR unavailable: {e}")
+    
+    def _tesserocr_api(self) -> "PyTessBaseAPI":
+        """This thread's tesserocr engine, initialized once with the same settings as tesseract_config"""
+        api = getattr(self._tesserocr_local, "api", None)
+        if api is None:
+            api = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK, oem=OEM.DEFAULT)
+            api.SetVariable("tessedit_char_whitelist", TESSERACT_CHAR_WHITELIST)
+            self._tesserocr_local.api = api
+        return api
     
-    def preprocess_image(self, image_path: str) -> Image.Image:
-        """Enhance image quality for better OCR"""
+    def _run_tesseract(self, image: Image.Image, psm: int) -> str:
+        """OCR an image in-process with tesserocr, or through the tesseract CLI via pytesseract"""
+        if TESSEROCR_AVAILABLE:
+            api = self._tesserocr_api()
+            # Switching modes on a live engine is free; nothing is reloaded
+            api.SetPageSegMode(psm)
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        return pytesseract.image_to_string(image, config=f"--psm {psm} {self.tesseract_config}")
+    
+    def preprocess_image(self, source: Union[str, Image.Image]) -> Image.Image:
+        """Enhance image quality for better OCR; source is a file path or an already-decoded image"""
+        if CV2_AVAILABLE:
+            binarized = self._binarize_with_opencv(source)
+            if binarized is not None:
+                return binarized
+        
         try:
-            image = Image.open(image_path)
+            image = Image.open(source) if isinstance(source, str) else source
             
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            # Tesseract reads grayscale anyway; one channel is a third of the pixels to filter
+            if image.mode != 'L':
+                image = image.convert('L')
             
             enhancer = ImageEnhance.Contrast(image)
             image = enhancer.enhance(1.5)
@@ -49,91 +233,130 @@ class OCRProcessor:
             return image
             
         except Exception as e:
-            logger.error(f"Image preprocessing failed {image_path}: {e}")
-            return Image.open(image_path)
+            logger.error(f"Image preprocessing failed {_describe_source(source)}: {e}")
+            return Image.open(source) if isinstance(source, str) else source
     
-    def extract_text_tesseract(self, image_path: str) -> str:
-        """Extract text using Tesseract OCR with retry logic"""
+    def _binarize_with_opencv(self, source: Union[str, Image.Image]) -> Optional[Image.Image]:
+        """Grayscale and adaptively threshold in one OpenCV pass; None if OpenCV cannot read the file"""
+        try:
+            if isinstance(source, str):
+                gray = cv2.imread(source, cv2.IMREAD_GRAYSCALE)
+            else:
+                gray = np.asarray(source.convert('L'))
+            if gray is None:
+                return None
+            # Local thresholds cope with uneven lighting across photographed reports
+            binary = cv2.adaptiveThreshold(
+                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                ADAPTIVE_THRESHOLD_BLOCK_SIZE, ADAPTIVE_THRESHOLD_OFFSET
+            )
+            return Image.fromarray(binary)
+        except Exception as e:
+            logger.warning(f"OpenCV preprocessing failed {_describe_source(source)}: {e}")
+            return None
+    
+    def extract_text_tesseract(self, source: Union[str, Image.Image]) -> str:
+        """Extract text using Tesseract OCR, moving to the next page segmentation mode on a poor read"""
+        try:
+            processed_image = self.preprocess_image(source)
+        except Exception as e:
+            logger.error(f"Tesseract input could not be loaded: {e}")
+            return ""
+        
+        best_text = ""
+        for psm in TESSERACT_PAGE_SEG_MODES:
+            text = self._run_tesseract_with_retries(processed_image, psm)
+            if len(text) > 10:
+                logger.info(f"Tesseract (psm {psm}) extracted {len(text)} characters")
+                return text
+            
+            logger.info(f"Tesseract (psm {psm}) read {len(text)} characters")
+            if len(text) > len(best_text):
+                best_text = text
+        
+        return best_text
+    
+    def _run_tesseract_with_retries(self, image: Image.Image, psm: int) -> str:
+        """Stripped Tesseract output for one page segmentation mode, retrying engine errors"""
         for attempt in range(self.max_retries + 1):
             try:
-                processed_image = self.preprocess_image(image_path)
-                text = pytesseract.image_to_string(processed_image, config=self.tesseract_config)
-                
-                if text.strip():
-                    logger.info(f"Tesseract extracted {len(text)} characters")
-                    return text.strip()
-                elif attempt < self.max_retries:
-                    logger.warning(f"Tesseract attempt {attempt + 1} returned empty, retrying...")
-                    continue
-                    
+                return self._run_tesseract(image, psm).strip()
             except Exception as e:
                 if attempt < self.max_retries:
                     logger.warning(f"Tesseract attempt {attempt + 1} failed: {e}, retrying...")
-                    continue
                 else:
                     logger.error(f"Tesseract failed after {self.max_retries + 1} attempts: {e}")
-                    
+        
         return ""
     
-    def extract_text_ocr_space(self, image_path: str) -> str:
+    def extract_text_ocr_space(self, source: Union[str, Image.Image]) -> str:
         """Extract text using OCR.space API with retry logic"""
         if not self.ocr_space_api_key:
             logger.warning("OCR.space API key not provided")
             return ""
         
+        try:
+            upload = self._ocr_space_upload(source)
+        except Exception as e:
+            logger.error(f"OCR.space upload preparation failed: {e}")
+            return ""
+        
         for attempt in range(self.max_retries + 1):
             try:
-                with open(image_path, "rb") as image_file:
-                    files = {'file': (os.path.basename(image_path), image_file, 'image/jpeg')}
-                    
-                    data = {
-                        'apikey': self.ocr_space_api_key,
-                        'language': 'eng',
-                        'ocrEngine': '2',
-                        'detectOrientation': 'true',
-                        'isTable': 'true',
-                        'scale': 'true',
-                        'isSearchablePdfHideTextLayer': 'true'
-                    }
-                    
-                    response = requests.post(self.ocr_space_url, files=files, data=data, timeout=30)
+                files = {'file': upload}
+                
+                data = {
+                    'apikey': self.ocr_space_api_key,
+                    'language': 'eng',
+                    'ocrEngine': '2',
+                    'detectOrientation': 'true',
+                    'isTable': 'true',
+                    'scale': 'true',
+                    'isSearchablePdfHideTextLayer': 'true'
+                }
+                
+                response = self._session.post(self.ocr_space_url, files=files, data=data, timeout=30)
+                
+                if response.status_code == 200:
+                    result = response.json()
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        
-                        if result.get("IsErroredOnProcessing"):
-                            error_msg = result.get("ErrorMessage", ["Unknown error"])[0]
-                            if attempt < self.max_retries:
-                                logger.warning(f"OCR.space attempt {attempt + 1} error: {error_msg}, retrying...")
-                                continue
-                            else:
-                                logger.error(f"OCR.space failed after retries: {error_msg}")
-                                return ""
-                        
-                        if result.get("ParsedResults"):
-                            parsed_text = result["ParsedResults"][0]["ParsedText"]
-                            if parsed_text.strip():
-                                logger.info(f"OCR.space extracted {len(parsed_text)} characters")
-                                return parsed_text
-                            elif attempt < self.max_retries:
-                                logger.warning(f"OCR.space attempt {attempt + 1} returned empty, retrying...")
-                                continue
-                    else:
+                    if result.get("IsErroredOnProcessing"):
+                        error_msg = result.get("ErrorMessage", ["Unknown error"])[0]
                         if attempt < self.max_retries:
-                            logger.warning(f"OCR.space attempt {attempt + 1} failed: {response.status_code}, retrying...")
+                            logger.warning(f"OCR.space attempt {attempt + 1} error: {error_msg}, retrying...")
                             continue
                         else:
-                            logger.error(f"OCR.space failed after retries: {response.status_code}")
+                            logger.error(f"OCR.space failed after retries: {error_msg}")
+                            return ""
+                    
+                    if result.get("ParsedResults"):
+                        parsed_text = result["ParsedResults"][0]["ParsedText"]
+                        if parsed_text.strip():
+                            logger.info(f"OCR.space extracted {len(parsed_text)} characters")
+                            return parsed_text
+                        elif attempt < self.max_retries:
+                            logger.warning(f"OCR.space attempt {attempt + 1} returned empty, retrying...")
+                            continue
+                else:
+                    logger.error(f"OCR.space failed: {response.status_code}")
+                    return ""
             
             except Exception as e:
-                if attempt < self.max_retries:
-                    logger.warning(f"OCR.space attempt {attempt + 1} error: {e}, retrying...")
-                    continue
-                else:
-                    logger.error(f"OCR.space failed after {self.max_retries + 1} attempts: {e}")
+                logger.error(f"OCR.space request failed: {e}")
+                return ""
                     
         return ""
     
+    def _ocr_space_upload(self, source: Union[str, Image.Image]) -> tuple:
+        """(filename, bytes, content type) for the multipart upload; decoded images are sent as JPEG"""
+        if isinstance(source, str):
+            with open(source, "rb") as image_file:
+                return os.path.basename(source), image_file.read(), 'image/jpeg'
+        
+        buffer = io.BytesIO()
+        source.convert('RGB').save(buffer, 'JPEG')
+        return "page.jpg", buffer.getvalue(), 'image/jpeg'
+    
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text from PDF with retry logic"""
         try:
@@ -141,6 +364,7 @@ class OCRProcessor:
             
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
+                page_count = len(pdf_reader.pages)
                 for page_num, page in enumerate(pdf_reader.pages):
                     page_text = page.extract_text()
                     if page_text.strip():
@@ -149,18 +373,20 @@ class OCRProcessor:
             if not text.strip():
                 logger.info("PDF direct extraction failed, converting to images")
                 try:
-                    images = convert_from_path(pdf_path)
-                    
-                    for i, image in enumerate(images):
-                        temp_image_path = f"temp_pdf_page_{i}_{os.getpid()}.jpg"
-                        image.save(temp_image_path, 'JPEG')
-                        
+                    page_numbers = range(1, page_count + 1)
+                    if page_count > 1:
+                        # Pages are independent; each worker rasterizes and OCRs only its own page
+                        executor = _get_page_workers()
                         try:
-                            page_text = self.extract_text(temp_image_path)
-                            text += page_text + "\n"
-                        finally:
-                            if os.path.exists(temp_image_path):
-                                os.remove(temp_image_path)
+                            page_texts = list(executor.map(partial(_ocr_pdf_page_worker, pdf_path), page_numbers))
+                        except BrokenProcessPool:
+                            _reset_page_workers(executor)
+                            raise
+                    else:
+                        page_texts = [self.ocr_pdf_page(pdf_path, page_number) for page_number in page_numbers]
+                    
+                    for page_text in page_texts:
+                        text += page_text + "\n"
                 
                 except Exception as pdf_error:
                     logger.error(f"PDF to image conversion failed: {pdf_error}")
@@ -172,63 +398,189 @@ class OCRProcessor:
             logger.error(f"PDF processing failed: {e}")
             raise Exception(f"PDF processing failed: {e}")
     
+    def ocr_pdf_page(self, pdf_path: str, page_number: int) -> str:
+        """Rasterize a single PDF page (1-based) and OCR it"""
+        # The rasterized page goes straight to OCR, with no temporary JPEG on disk
+        image = convert_from_path(pdf_path, first_page=page_number, last_page=page_number)[0]
+        return self._ocr_image(image)
+    
     def extract_text(self, file_path: str) -> str:
-        """Extract text with Tesseract + OCR.space fallback"""
+        """Extract text with Tesseract + OCR.space fallback, reusing the result for files seen before"""
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
+        if self._cache_dir is None:
+            return self._extract_text_uncached(file_path)
+        
+        cache_key = self._cache_key(file_path)
+        cached_text = self._read_cached_text(cache_key)
+        if cached_text is not None:
+            logger.info(f"Using cached OCR result for {file_path}")
+            return cached_text
+        
+        text = self._extract_text_uncached(file_path)
+        self._write_cached_text(cache_key, text)
+        return text
+    
+    @staticmethod
+    def _open_cache_dir(cache_dir: str) -> Optional[Path]:
+        """Create the cache directory, or refuse one that another user could read or plant entries in"""
+        path = Path(cache_dir)
+        try:
+            path.mkdir(mode=0o700, parents=True, exist_ok=True)
+            # lstat, so a symlink planted at the path is rejected rather than followed
+            info = os.lstat(path)
+        except OSError as e:
+            logger.warning(f"OCR cache disabled - cannot create {path}: {e}")
+            return None
+        
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) != 0o700:
+            logger.warning(f"OCR cache disabled - {path} must be a directory owned by this user with mode 0700")
+            return None
+        return path
+    
+    def _cache_key(self, file_path: str) -> str:
+        """Content hash of the file plus the OCR settings that produced its text"""
+        digest = hashlib.blake2b(digest_size=16)
+        # Hashed in fixed-size reads so large PDFs never sit in memory whole
+        with open(file_path, 'rb') as file:
+            for chunk in iter(partial(file.read, CACHE_HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        digest.update(self._cache_salt)
+        return digest.hexdigest()
+    
+    def _read_cached_text(self, cache_key: str) -> Optional[str]:
+        entry = self._cache_dir / f"{cache_key}.txt"
+        try:
+            if time.time() - entry.stat().st_mtime > OCR_CACHE_TTL:
+                entry.unlink(missing_ok=True)
+                return None
+            return entry.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"OCR cache read failed: {e}")
+            return None
+    
+    def _write_cached_text(self, cache_key: str, text: str):
+        """Write atomically so concurrent readers never see a partial entry"""
+        try:
+            # mkstemp creates the file readable by this user only; reports are medical data
+            fd, temp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as file:
+                    file.write(text)
+                os.replace(temp_path, self._cache_dir / f"{cache_key}.txt")
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"OCR cache write failed: {e}")
+            return
+        self._evict_cached_text()
+    
+    def _evict_cached_text(self):
+        """Remove expired entries, then the oldest ones beyond OCR_CACHE_MAX_ENTRIES"""
+        entries = []
+        now = time.time()
+        for entry in self._cache_dir.glob("*.txt"):
+            try:
+                mtime = entry.stat().st_mtime
+                if now - mtime > OCR_CACHE_TTL:
+                    entry.unlink(missing_ok=True)
+                else:
+                    entries.append((mtime, entry))
+            except OSError:
+                continue
+        
+        entries.sort()
+        for _, entry in entries[:max(len(entries) - OCR_CACHE_MAX_ENTRIES, 0)]:
+            try:
+                entry.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"OCR cache eviction failed: {e}")
+    
+    def _extract_text_uncached(self, file_path: str) -> str:
+        """Extract and clean the text of a PDF or image file"""
         file_ext = os.path.splitext(file_path)[1].lower()
         
         if file_ext == '.pdf':
             return self.extract_text_from_pdf(file_path)
         
         logger.info(f"Processing {file_path}")
+        cleaned_text = self._clean_text(self._ocr_image(file_path))
+        logger.info(f"Extracted {len(cleaned_text)} characters")
+        return cleaned_text
+    
+    def _ocr_image(self, source: Union[str, Image.Image]) -> str:
+        """Run Tesseract on an image file or decoded image, falling back to OCR.space; the text is not cleaned"""
+        # Blurry or small images reliably defeat Tesseract; try OCR.space on them first
+        ocr_space_text = None
+        if self.ocr_space_api_key and self._is_low_quality(source):
+            logger.info("Low image quality, trying OCR.space before Tesseract")
+            ocr_space_text = self.extract_text_ocr_space(source)
         
-        tesseract_text = self.extract_text_tesseract(file_path)
-        
-        if not tesseract_text or len(tesseract_text.strip()) < 10:
-            logger.info("Tesseract insufficient, trying OCR.space")
-            ocr_space_text = self.extract_text_ocr_space(file_path)
+        if ocr_space_text and len(ocr_space_text.strip()) >= 10:
+            text = ocr_space_text
+            logger.info("Using OCR.space results")
+        else:
+            tesseract_text = self.extract_text_tesseract(source)
             
-            if ocr_space_text and len(ocr_space_text.strip()) > len(tesseract_text.strip()):
-                text = ocr_space_text
-                logger.info("Using OCR.space results")
+            if not tesseract_text or len(tesseract_text.strip()) < 10:
+                if ocr_space_text is None:
+                    logger.info("Tesseract insufficient, trying OCR.space")
+                    ocr_space_text = self.extract_text_ocr_space(source)
+                
+                if ocr_space_text and len(ocr_space_text.strip()) > len(tesseract_text.strip()):
+                    text = ocr_space_text
+                    logger.info("Using OCR.space results")
+                else:
+                    text = tesseract_text
+                    logger.info("Using Tesseract results")
             else:
                 text = tesseract_text
-                logger.info("Using Tesseract results")
-        else:
-            text = tesseract_text
-            logger.info("Tesseract successful")
+                logger.info("Tesseract successful")
         
         if not text or len(text.strip()) < 5:
             raise Exception("No readable text found in image. Please ensure image is clear and contains text.")
         
-        cleaned_text = self._clean_text(text)
-        logger.info(f"Extracted {len(cleaned_text)} characters")
-        return cleaned_text
+        return text
+    
+    def _is_low_quality(self, source: Union[str, Image.Image]) -> bool:
+        """Whether the image is too small or too blurry for Tesseract (needs OpenCV)"""
+        if not CV2_AVAILABLE:
+            return False
+        
+        try:
+            if isinstance(source, str):
+                with Image.open(source) as image:
+                    width, height = image.size
+            else:
+                width, height = source.size
+            if min(width, height) < OCR_MIN_SHORT_SIDE:
+                return True
+            
+            gray = cv2.imread(source, cv2.IMREAD_GRAYSCALE) if isinstance(source, str) else np.asarray(source.convert('L'))
+            if gray is None:
+                return False
+            # Variance of the Laplacian: low when edges (and so glyphs) are soft
+            return cv2.Laplacian(gray, cv2.CV_64F).var() < OCR_MIN_SHARPNESS
+        except Exception as e:
+            logger.warning(f"Image quality check failed {_describe_source(source)}: {e}")
+            return False
     
     def _clean_text(self, text: str) -> str:
         """Clean and normalize extracted text"""
         if not text:
             return ""
         
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'[^\w\s\.,\(\)\-\%\:\;\/\<\>]', '', text)
-        
-        replacements = {
-            r'\bO\b(?=\s*\d)': '0',
-            r'\bl\b(?=\s*\d)': '1',
-            r'\bS\b(?=\s*\d)': '5',
-            r'mg/dl': 'mg/dL',
-            r'g/dl': 'g/dL',
-            r'meq/l': 'mEq/L',
-            r'mmol/l': 'mmol/L',
-            r'iu/l': 'IU/L',
-            r'u/l': 'U/L'
-        }
-        
-        for pattern, replacement in replacements.items():
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+        text = _WHITESPACE_RE.sub(' ', text)
+        text = _DISALLOWED_CHARS_RE.sub('', text)
+        
+        for pattern, replacement in _DIGIT_FIXES:
+            text = pattern.sub(replacement, text)
+        
+        text = _UNIT_RE.sub(lambda match: _UNIT_FIXES[match.group(0).lower()], text)
         
         return text.strip()
     
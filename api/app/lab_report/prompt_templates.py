@@ -5,13 +5,14 @@ Contains specialized prompt templates for medical lab report analysis
 
 import json
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import BaseOutputParser
 
 class MedicalPromptTemplates:
     """Medical-specific prompt templates for LLM analysis"""
     
-    LAB_ANALYSIS_TEMPLATE = """You are MedicoBud, a medical AI for lab report analysis. Your response MUST be a single, valid JSON object, without any markdown formatting like ```json.
+    LAB_ANALYSIS_SYSTEM_PROMPT = """You are MedicoBud, a medical AI for lab report analysis. Your response MUST be a single, valid JSON object, without any markdown formatting like ```json.
 
 ## INTERNAL PROCESSING INSTRUCTIONS (DO NOT OUTPUT THESE STEPS):
 
@@ -34,14 +35,8 @@ You will then parse every lab test, value, unit, and reference range—even thou
 - Your job is to tell the user whether ALL their lab values are normal or need medical attention.
 - For all values, you can infer the standard normal ranges independently based on commonly accepted clinical standards.
 
-## Data:
-Text: {lab_text}
-Entities: {medical_entities}
-Values: {lab_values}
-Analysis: {lab_analysis}
-
 ## INSTRUCTIONS:
-- Carefully extract ALL laboratory test names, their corresponding measured values, units, and reference ranges from the text provided, even if the text is unstructured or noisy.
+- Carefully extract ALL laboratory test names, their corresponding measured values, units, and reference ranges from the data in the user message, even if the text is unstructured or noisy.
 - Pay attention to any numeric values directly following test names.
 - If abnormality markers like "L" (Low), "H" (High), or other flags appear after values, include them when determining status.
 - If multiple values are combined on one line, separate them into individual tests.
@@ -88,15 +83,98 @@ Analysis: {lab_analysis}
 7.  **MANDATORY**: Every test parsed MUST appear as an object in the `values` array.
 8.  **Output**: Ensure the entire output is a single valid JSON object and nothing else. Do not wrap it in markdown."""
 
+    LAB_ANALYSIS_USER_TEMPLATE = """## Data:
+Text: {lab_text}
+Entities: {medical_entities}
+Values: {lab_values}
+Analysis: {lab_analysis}"""
+
+    BULK_LAB_ANALYSIS_SYSTEM_PROMPT = """You are MedicoBud, a medical AI for lab report analysis. You will receive several independent lab reports, each delimited by "=== REPORT i ===" and "=== END REPORT i ===".
+
+## INSTRUCTIONS:
+- Treat every report separately; never mix values between reports.
+- For each report, extract ALL laboratory test names, measured values, units and reference ranges, even if the OCR text is noisy.
+- Include abnormality markers like "L" (Low) or "H" (High) when determining status and ignore non-medical OCR noise.
+- Infer standard normal ranges from commonly accepted clinical standards when none are given.
+- Critical thresholds: Glucose <50/>400, Hemoglobin <7/>20, WBC <1/>50, Platelets <20/>1000, K+ <2.5/>6.0, Na+ <120/>160.
+
+## REQUIRED OUTPUT FORMAT:
+For each report i, in order, output a line "=== ANALYSIS i ===" followed by a single valid JSON object (no markdown) with EXACTLY this structure:
+{{
+  "summary": "A brief, 1-2 sentence summary of the key findings.",
+  "values": [
+    {{
+      "test": "Name of the Lab Test",
+      "value": "Measured Value",
+      "unit": "Unit of Measurement",
+      "range": "Reference Range (e.g., '70-110')",
+      "status": "NORMAL | HIGH | LOW | CRITICAL"
+    }}
+  ],
+  "status": {{
+    "normal": 0,
+    "abnormal": 0,
+    "critical": 0
+  }},
+  "recommendations": {{
+    "lifestyle": "Specific, actionable lifestyle advice.",
+    "followUp": "Recommendations for follow-up tests and timing.",
+    "doctor": "Urgency and points to discuss with a doctor."
+  }}
+}}"""
+
+    BULK_LAB_ANALYSIS_USER_TEMPLATE = """## Reports ({report_count}):
+{reports}"""
+
 class PromptManager:
     """Manages prompt templates and provides formatted prompts"""
     
     def __init__(self):
         self.templates = MedicalPromptTemplates()
+        # Templates are static, so parse them once and reuse the compiled prompts
+        self._lab_analysis_prompt = ChatPromptTemplate.from_messages([
+            ("system", self.templates.LAB_ANALYSIS_SYSTEM_PROMPT),
+            ("human", self.templates.LAB_ANALYSIS_USER_TEMPLATE)
+        ])
+        self._bulk_lab_analysis_prompt = ChatPromptTemplate.from_messages([
+            ("system", self.templates.BULK_LAB_ANALYSIS_SYSTEM_PROMPT),
+            ("human", self.templates.BULK_LAB_ANALYSIS_USER_TEMPLATE)
+        ])
+    
+    def get_lab_analysis_prompt(self, lab_data: Dict[str, Any] = None) -> ChatPromptTemplate:
+        """Get lab analysis prompt: static system instructions first, report data last for prefix caching"""
+        return self._lab_analysis_prompt
+    
+    def get_bulk_lab_analysis_prompt(self) -> ChatPromptTemplate:
+        """Get prompt for analyzing several lab reports in one request"""
+        return self._bulk_lab_analysis_prompt
+    
+    def get_prompt_and_parser(self, operation: str) -> Tuple[ChatPromptTemplate, Optional[BaseOutputParser]]:
+        """Get the prompt template and optional output parser for a named LLM operation"""
+        operations = {
+            "comprehensive lab analysis": (self._lab_analysis_prompt, None),
+            "bulk lab analysis": (self._bulk_lab_analysis_prompt, None)
+        }
+        
+        if operation not in operations:
+            raise ValueError(f"Unknown LLM operation: {operation}")
+        
+        return operations[operation]
     
-    def get_lab_analysis_prompt(self, lab_data: Dict[str, Any]) -> ChatPromptTemplate:
-        """Get formatted lab analysis prompt"""
-        return ChatPromptTemplate.from_template(self.templates.LAB_ANALYSIS_TEMPLATE)
+    def format_bulk_reports(self, reports: List[Dict[str, Any]]) -> str:
+        """Format several lab reports into numbered, delimited blocks"""
+        blocks = []
+        for i, lab_data in enumerate(reports, 1):
+            formatted = self.format_lab_data_for_prompt(self.validate_prompt_data(lab_data))
+            blocks.append(
+                f"=== REPORT {i} ===\n"
+                f"Text: {formatted['lab_text']}\n"
+                f"Entities: {formatted['medical_entities']}\n"
+                f"Values: {formatted['lab_values']}\n"
+                f"Analysis: {formatted['lab_analysis']}\n"
+                f"=== END REPORT {i} ==="
+            )
+        return "\n\n".join(blocks)
     
     def format_lab_data_for_prompt(self, lab_data: Dict[str, Any]) -> Dict[str, str]:
         """Format lab data for use in prompts"""
@@ -182,6 +260,18 @@ class PromptManager:
         
         return validated_data
     
+    def split_bulk_response(self, response_text: str, report_count: int) -> List[Optional[str]]:
+        """Split a bulk LLM response into per-report sections, None where a section is missing"""
+        sections: List[Optional[str]] = [None] * report_count
+        parts = re.split(r'^\s*=== ANALYSIS (\d+) ===\s*$', response_text, flags=re.MULTILINE)
+        
+        for index, body in zip(parts[1::2], parts[2::2]):
+            position = int(index) - 1
+            if 0 <= position < report_count and body.strip():
+                sections[position] = body.strip()
+        
+        return sections
+    
     def parse_compact_response(self, response_text: str) -> Dict[str, Any]:
         """Parse the JSON response from the LLM into a dictionary"""
         json_match = re.search(r'```json\s*([\s\S]*?)\s*```|({[\s\S]*})', response_text)
@@ -14,6 +14,9 @@ import hmac
 import hashlib
 import json
 import os
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
 from contextlib import asynccontextmanager
 from typing import Literal, Optional, List
 from .db import engine, Base, get_db
@@ -31,6 +34,7 @@ from .api_methods.profile import router as profile_router
 from .api_methods.doctorVisit import router as doctor_visit_router
 from .api_methods.labReport import router as lab_report_router
 from .lab_report.lab_report_api import router as lab_report_analysis_router
+from .lab_report.llm_client import start_client as start_llm_client, stop_client as stop_llm_client
 from .api_methods.symptomSession import router as symptom_session_router
 from .routes.chat import router as chat_router
 from .temp.temp_user import temp_user_manager
@@ -38,10 +42,24 @@ from .temp.temp_apis import router as temp_user_router
 
 load_dotenv()
 
+def start_queue_logging() -> QueueListener:
+    """Route root log records through a queue so request handlers never block on log I/O"""
+    root_logger = logging.getLogger()
+    handlers = root_logger.handlers[:] or [logging.StreamHandler()]
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root_logger.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    log_listener = start_queue_logging()
     print("🚀 Medicobud API started")
+    await start_llm_client()
     yield
+    await stop_llm_client()
+    log_listener.stop()
     print("🛑 Medicobud API stopped")
 
 app = FastAPI(